@@ -1,22 +1,312 @@
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 import os
 # Suppress the GitPython warning
 os.environ['GIT_PYTHON_REFRESH'] = 'quiet'
-import qlib
-from qlib.constant import REG_CN
+# GBDT training already runs one OpenMP thread per core via n_jobs; keep BLAS from adding
+# its own thread pool on top. This only takes effect if NumPy has not loaded yet (run.bat
+# sets it before launch) and always applies to the data scripts run as subprocesses.
+# OMP_NUM_THREADS is left alone since it would also throttle PyTorch (ALSTM).
+for _blas_var in ("OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(_blas_var, "1")
 from pathlib import Path
 from qlib_utils import (
-    MODELS, FACTORS, train_model, predict, backtest_strategy,
+    MODELS, FACTORS, train_model, predict_batch, backtest_strategy,
     update_daily_data, check_data_health, get_data_summary, get_historical_prediction,
-    evaluate_model, load_settings, save_settings, get_model_info
+    evaluate_model, load_settings, save_settings, get_model_info, load_model
 )
 import pandas as pd
-import plotly.express as px
+import numpy as np
 import datetime
-import copy
+import time
+import subprocess
+import sys
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Number of log lines kept per page in session state
+LOG_MAX_LINES = 5000
+# Longer option lists are truncated in selectboxes, with a text input for the rest
+SELECTBOX_MAX_OPTIONS = 200
+
+# Offsets for the default date-input values
+_ONE_DAY = datetime.timedelta(days=1)
+_ONE_WEEK = datetime.timedelta(days=7)
+_NINETY_DAYS = datetime.timedelta(days=90)
+_ONE_YEAR = datetime.timedelta(days=365)
+
+# Default data and model locations, resolved once per process
+_HOME = Path.home()
+_DEFAULT_QLIB_DIR = str(_HOME / ".qlib" / "qlib_data")
+_DEFAULT_QLIB_CN_DIR = str(_HOME / ".qlib" / "qlib_data" / "cn_data")
+_DEFAULT_MODELS_DIR = str(_HOME / "qlib_models")
+
+_MODEL_NAMES = tuple(MODELS)
+_FACTOR_NAMES = tuple(FACTORS)
+
+# --- Cached Helpers ---
+
+@lru_cache(maxsize=16)
+def _expand_path(path: str) -> Path:
+    """`Path(path).expanduser()`, memoized per settings string."""
+    return Path(path).expanduser()
+
+def _path_mtime(path) -> int:
+    """Returns the mtime of `path` in nanoseconds, or 0 if it does not exist. Used as a cache key."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+def _data_mtime(qlib_dir: str) -> int:
+    # The calendar file is rewritten by every incremental update, so it tracks data
+    # freshness better than the data directory itself. The instruments directory
+    # changes when stock pool files are added or removed.
+    qlib_path = Path(qlib_dir)
+    return max(
+        _path_mtime(qlib_path),
+        _path_mtime(qlib_path / "calendars" / "day.txt"),
+        _path_mtime(qlib_path / "instruments"),
+    )
+
+@lru_cache(maxsize=1)
+def _physical_cores() -> int:
+    """
+    Number of physical CPU cores, the default GBDT thread count. `os.cpu_count()` also
+    counts SMT siblings, which only contend for the same cores' caches and FPUs.
+    Uses psutil if installed, then /proc/cpuinfo, then falls back to the logical count.
+    """
+    try:
+        import psutil
+        cores = psutil.cpu_count(logical=False)
+        if cores:
+            return cores
+    except ImportError:
+        pass
+    try:
+        with open("/proc/cpuinfo") as f:
+            core_ids, physical_id = set(), None
+            for line in f:
+                key, _, value = line.partition(":")
+                key = key.strip()
+                if key == "physical id":
+                    physical_id = value.strip()
+                elif key == "core id":
+                    core_ids.add((physical_id, value.strip()))
+        if core_ids:
+            return len(core_ids)
+    except OSError:
+        pass
+    return os.cpu_count() or 1
+
+@st.cache_resource(show_spinner=False)
+def _settings_singleton() -> dict:
+    # Read config.json once per process; cleared whenever the settings are saved.
+    return load_settings()
+
+@st.cache_data(ttl="5m", max_entries=8, show_spinner=False)
+def _cached_data_summary(qlib_dir: str, mtime: int):
+    return get_data_summary(qlib_dir)
+
+@lru_cache(maxsize=256)
+def _cached_model_info(model_path: str, mtime: int):
+    # Keyed on the sidecar YAML, which is what get_model_info actually reads. A plain
+    # lru_cache skips st.cache_data's hashing and pickling for this small dict, so
+    # callers must treat the result as read-only.
+    return get_model_info(model_path)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _list_pkl(models_dir: str, mtime: int) -> list:
+    """
+    Lists the `.pkl` model files in `models_dir`, sorted by name. The directory mtime
+    catches local changes; the TTL covers network filesystems that report it late.
+    """
+    try:
+        with os.scandir(_expand_path(models_dir)) as it:
+            return sorted(e.name for e in it if e.name.endswith(".pkl") and e.is_file())
+    except OSError:
+        return []
+
+def _available_models(models_dir: str):
+    """Returns the expanded models directory and the `.pkl` files in it, shared by every page."""
+    models_dir_path = _expand_path(models_dir)
+    return models_dir_path, _list_pkl(str(models_dir_path), _path_mtime(models_dir_path))
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _load_model(model_path: str, mtime: int):
+    return load_model(model_path)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _cached_predict_batch(model_items: tuple, qlib_dir: str, date_str: str):
+    # `model_items` holds (model_path, mtime) pairs so retrained models miss the cache.
+    # No Streamlit elements may be written in here: a cache hit would replay them.
+    models = {model_path: _load_model(model_path, mtime) for model_path, mtime in model_items}
+    return predict_batch(list(models), qlib_dir, date_str, models=models)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _cached_historical_prediction(model_path: str, model_mtime: int, qlib_dir: str, stock_id: str, start_date: str, end_date: str):
+    # Progress is shown by the caller; element calls in here would be replayed on a cache hit.
+    return get_historical_prediction(
+        model_path, qlib_dir, stock_id, start_date, end_date,
+        model=_load_model(model_path, model_mtime)
+    )
+
+# Backtests and evaluations take minutes, so their results are also kept on disk and
+# survive server restarts. Both run on the job executor; the model is only loaded on a miss.
+# max_entries bounds how many of the (fairly large) result frames are held in memory.
+@st.cache_data(persist="disk", max_entries=32, show_spinner=False)
+def _cached_backtest(model_path: str, model_mtime: int, qlib_dir: str, data_mtime: int, start_date: str, end_date: str, strategy_items: tuple, exchange_items: tuple):
+    return backtest_strategy(
+        model_path, qlib_dir, start_date, end_date, dict(strategy_items), dict(exchange_items),
+        model=_load_model(model_path, model_mtime)
+    )
+
+@st.cache_data(persist="disk", max_entries=32, show_spinner=False)
+def _cached_evaluation(model_path: str, model_mtime: int, qlib_dir: str, data_mtime: int, _log_placeholder=None):
+    # On a hit the live log stays empty; the page shows the cached log lines instead.
+    return evaluate_model(model_path, qlib_dir, log_placeholder=_log_placeholder, model=_load_model(model_path, model_mtime))
+
+# --- Plot Helpers ---
+
+LTTB_THRESHOLD = 2000 # Series longer than this are downsampled before plotting
+
+def _lttb(x: np.ndarray, y: np.ndarray, n_out: int = 1500) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling; keeps the visual shape of a line series.
+    Returns the positions of the points to keep.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    xf = x.astype(np.float64)
+    yf = y.astype(np.float64)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    # Interior points are split into n_out - 2 buckets between the fixed endpoints
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        nxt_start, nxt_end = edges[i + 1], (edges[i + 2] if i + 2 < len(edges) else n)
+        avg_x = xf[nxt_start:nxt_end].mean()
+        avg_y = yf[nxt_start:nxt_end].mean()
+        areas = np.abs((xf[a] - avg_x) * (yf[start:end] - yf[a]) - (xf[a] - xf[start:end]) * (avg_y - yf[a]))
+        a = start + int(np.argmax(areas))
+        idx[i + 1] = a
+    return idx
+
+def _arrow_table(df):
+    """Convert a result table to Arrow once so reruns hand Streamlit ready-made
+    Arrow data instead of re-converting the DataFrame every time."""
+    import pyarrow as pa
+    try:
+        return pa.Table.from_pandas(df)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        # Mixed-type object columns: let st.dataframe apply its own fallbacks
+        return df
+
+def _downsample_series(index, values):
+    """Returns (x, y) for plotting, LTTB-downsampled when the series is long."""
+    values = np.asarray(values)
+    if len(values) <= LTTB_THRESHOLD:
+        return index, values
+    dates = pd.DatetimeIndex(pd.to_datetime(index))
+    idx = _lttb(dates.asi8, values)
+    return dates[idx], values[idx]
+
+# --- Background Jobs ---
+
+@st.cache_resource
+def _job_executor():
+    # Shared by all sessions. A single worker: Qlib's config, data providers and expression
+    # cache are process-global and not thread-safe, so two jobs must never use them at once.
+    return ThreadPoolExecutor(max_workers=1)
+
+class _JobLog:
+    """
+    Stands in for an `st.empty()` log placeholder inside a background job.
+    Worker threads cannot update Streamlit elements, so the latest log text is
+    kept here and rendered by the page while it polls the job.
+    """
+
+    def __init__(self):
+        self.text = ""
+
+    def code(self, body, language=None):
+        self.text = body
+
+def _start_job(key: str, fn, *args, job_log=None, **kwargs):
+    """
+    Submits `fn(*args, **kwargs)` to the job executor and tracks it in `st.session_state[key]`.
+    `job_log` is the `_JobLog` that `fn` writes its log to, if any.
+    """
+    future = _job_executor().submit(fn, *args, **kwargs)
+    st.session_state[key] = {"future": future, "log": job_log or _JobLog()}
+
+def _rerun_fragment():
+    # Pages are fragments, so this only reruns the page body, not the sidebar.
+    # During a full-app run (e.g. right after switching pages) only an app rerun is allowed.
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+def _poll_job(key: str, log_placeholder=None, interval: float = 1.0):
+    """
+    Checks on a job started with `_start_job`. While it is running, the latest log is
+    shown in `log_placeholder` and the calling page fragment is rerun after `interval` seconds.
+    Once it finishes, the job is forgotten and the fragment reruns one more time, so buttons
+    and status lines drawn from `key in st.session_state` are re-rendered without the job.
+    Returns the finished Future on that run, or None if there is no finished job.
+    """
+    finished_key = f"{key}_finished"
+    job = st.session_state.pop(finished_key, None)
+    if job is not None:
+        if log_placeholder is not None and job["log"].text:
+            log_placeholder.code(job["log"].text, language='log')
+        return job["future"]
+    job = st.session_state.get(key)
+    if job is None:
+        return None
+    if log_placeholder is not None and job["log"].text:
+        log_placeholder.code(job["log"].text, language='log')
+    if not job["future"].done():
+        time.sleep(interval)
+        _rerun_fragment()
+    del st.session_state[key]
+    st.session_state[finished_key] = job
+    _rerun_fragment()
+
+@st.cache_resource
+def _io_executor():
+    # Quick filesystem scans; kept apart from the job executor so they never queue behind a training run
+    return ThreadPoolExecutor(max_workers=2)
+
+def _data_summary_future(qlib_dir: str):
+    """
+    Returns a Future for the data summary of `qlib_dir`, computed off the script thread.
+    Cache hits finish almost at once, so this waits briefly before handing back a
+    pending Future; only a cold directory scan leaves the page to render without it.
+    """
+    key = (qlib_dir, _data_mtime(qlib_dir))
+    pending = st.session_state.get("summary_future")
+    if pending is None or pending[0] != key:
+        pending = (key, _io_executor().submit(_cached_data_summary, *key))
+        st.session_state.summary_future = pending
+    wait([pending[1]], timeout=0.2)
+    return pending[1]
+
+@st.fragment(run_every=0.5)
+def _data_summary_loading():
+    # Stands in for the summary until the scan finishes, then reruns the app to show it
+    if st.session_state.summary_future[1].done():
+        st.rerun()
+    st.info("正在加载数据概览...")
 
 # --- Streamlit Pages ---
 
+@st.fragment
 def data_management_page():
     st.header("数据管理")
     with st.expander("💡 操作指南 (Operation Guide)"):
@@ -45,25 +335,29 @@ def data_management_page():
 
     # Initialize session state for logs
     if "data_log" not in st.session_state:
-        st.session_state.data_log = ""
+        st.session_state.data_log = deque(maxlen=LOG_MAX_LINES)
 
-    qlib_dir = st.session_state.settings.get("qlib_data_path", str(Path.home() / ".qlib" / "qlib_data"))
+    qlib_dir = st.session_state.settings.get("qlib_data_path", _DEFAULT_QLIB_DIR)
     qlib_1d_dir = str(Path(qlib_dir) / "cn_data")
     st.info(f"当前Qlib数据路径: `{qlib_dir}` (可在左侧边栏修改)")
 
     st.subheader("本地数据概览")
-    summary = get_data_summary(qlib_1d_dir)
-    if summary["error"]:
-        st.warning(f"无法加载数据概览: {summary['error']}")
+    summary_future = _data_summary_future(qlib_1d_dir)
+    if summary_future.done():
+        summary = summary_future.result()
+        if summary["error"]:
+            st.warning(f"无法加载数据概览: {summary['error']}")
+        else:
+            col1, col2 = st.columns(2)
+            col1.metric("数据覆盖范围", summary["date_range"])
+            col2.metric("股票池数量", len(summary["instruments"]))
+            with st.expander("查看详细信息"):
+                st.json({
+                    "已发现的股票池文件": summary["instruments"],
+                    "已发现的数据字段": summary["fields"]
+                })
     else:
-        col1, col2 = st.columns(2)
-        col1.metric("数据覆盖范围", summary["date_range"])
-        col2.metric("股票池数量", len(summary["instruments"]))
-        with st.expander("查看详细信息"):
-            st.json({
-                "已发现的股票池文件": summary["instruments"],
-                "已发现的数据字段": summary["fields"]
-            })
+        _data_summary_loading()
 
     with st.expander("1. 全量数据部署 (首次使用)", expanded=False):
         st.info("由于直接从雅虎财经大量下载数据不稳定，推荐通过以下步骤手动下载社区提供的数据包来完成首次数据部署。")
@@ -86,36 +380,177 @@ def data_management_page():
 
     with st.container(height=400):
         log_placeholder = st.empty()
-        log_placeholder.code("日志输出将显示在此处" , language='log')
+        if st.session_state.data_log:
+            log_placeholder.code("\n".join(st.session_state.data_log), language='log')
+        else:
+            log_placeholder.code("日志输出将显示在此处" , language='log')
 
     col1, col2 = st.columns(2)
-    start_date = col1.date_input("更新开始日期", datetime.date.today() - datetime.timedelta(days=7))
-    end_date = col2.date_input("更新结束日期", datetime.date.today())
+    today = datetime.date.today()
+    start_date = col1.date_input("更新开始日期", today - _ONE_WEEK)
+    end_date = col2.date_input("更新结束日期", today)
 
     col1, col2 = st.columns(2)
     with col1:
         if st.button("开始增量更新", use_container_width=True):
-            with st.spinner(f"正在更新从 {start_date.strftime('%Y-%m-%d')} 到 {end_date.strftime('%Y-%m-%d')} 的数据..."):
+            with st.spinner(f"正在更新从 {start_date.isoformat()} 到 {end_date.isoformat()} 的数据..."):
                 try:
                     # Pass the placeholder directly for real-time updates
-                    update_daily_data(qlib_1d_dir, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"), log_placeholder)
+                    st.session_state.data_log.clear()
+                    st.session_state.data_log.extend(update_daily_data(qlib_1d_dir, start_date.isoformat(), end_date.isoformat(), log_placeholder))
+                    # The mtime key normally catches this, but coarse filesystem timestamps may not
+                    _cached_data_summary.clear()
+                    # Also drop this session's pending/finished scan, which is keyed on the same mtime
+                    st.session_state.pop("summary_future", None)
                     st.success("增量更新命令已成功执行！")
                 except Exception as e:
                     st.error(f"增量更新过程中发生错误。详情请查看上方日志。")
                     # The error details are already in the placeholder via the logger
 
     with col2:
-        n_jobs = st.number_input("健康检查并行数 (n_jobs)", -1, 64, -1, help="设置用于并行计算的线程数。-1 表示使用所有可用的CPU核心。")
-        if st.button("开始检查数据", use_container_width=True):
-            with st.spinner(f"正在并行检查数据 (n_jobs={n_jobs})..."):
-                try:
-                    # Pass the placeholder directly for real-time updates
-                    check_data_health(qlib_1d_dir, log_placeholder, n_jobs)
-                    st.success("数据健康度检查已完成！详情请查看上方日志。")
-                except Exception as e:
-                    st.error(f"检查过程中发生错误。详情请查看上方日志。")
-                    # The error details are already in the placeholder via the logger
+        n_jobs = st.number_input("健康检查并行数 (n_jobs)", -1, 64, -1, help="设置用于并行检查的进程数。-1 表示使用所有可用的CPU核心。")
+        if st.button("开始检查数据", use_container_width=True, disabled="health_job" in st.session_state):
+            st.session_state.data_log.clear()
+            # The check can take minutes on a full market, so it runs in the background
+            job_log = _JobLog()
+            _start_job("health_job", check_data_health, qlib_1d_dir, job_log, n_jobs, job_log=job_log)
+
+    if "health_job" in st.session_state:
+        st.info("正在后台并行检查数据...")
+    future = _poll_job("health_job", log_placeholder)
+    if future is not None:
+        try:
+            st.session_state.data_log.extend(future.result())
+            st.success("数据健康度检查已完成！详情请查看上方日志。")
+        except Exception as e:
+            st.error(f"检查过程中发生错误: {e}。详情请查看上方日志。")
+
+_LGB_CUDA_PROBE = (
+    "import numpy as np, lightgbm as lgb; "
+    "lgb.train({'device': 'cuda', 'verbose': -1}, lgb.Dataset(np.random.rand(64, 2), np.random.rand(64)), num_boost_round=1)"
+)
+
+@st.cache_resource(show_spinner="正在检测 LightGBM GPU 后端...")
+def _lgb_gpu_mode() -> str:
+    """
+    Returns 'cuda' if the installed LightGBM was built with CUDA support, else 'gpu' (OpenCL).
+    Probed once per process in a subprocess, so a broken GPU driver cannot crash the app.
+    """
+    try:
+        probe = subprocess.run([sys.executable, "-c", _LGB_CUDA_PROBE], capture_output=True, timeout=120)
+    except (OSError, subprocess.TimeoutExpired):
+        return "gpu"
+    return "cuda" if probe.returncode == 0 else "gpu"
+
+@st.fragment
+def _hparam_fragment(model_name: str, use_gpu: bool, params: dict) -> dict:
+    """
+    Renders the hyperparameter widgets and stores `params`, updated with their values, in
+    `st.session_state.train_params`. As a fragment, moving a slider only reruns this block,
+    so the training fragment reads the latest values from session state when it starts a job.
+    """
+    with st.expander("调节模型参数", expanded=True):
+        if any(m in model_name for m in ["LightGBM", "XGBoost", "CatBoost"]):
+            # Add n_jobs here for parallel processing
+            if not use_gpu: # n_jobs is for CPU parallelism
+                params['n_jobs'] = st.number_input("并行计算线程数 (n_jobs)", -1, 16, min(_physical_cores(), 16), help="设置用于并行计算的线程数，默认等于物理CPU核心数。-1 表示由模型库自行决定线程数。")
+
+            if "CatBoost" in model_name:
+                params['iterations'] = st.slider("迭代次数", 50, 500, params.get('iterations', 200), 10, key=f"it_{model_name}")
+                params['depth'] = st.slider("最大深度", 3, 15, params.get('depth', 7), key=f"depth_{model_name}")
+            else:
+                params['n_estimators'] = st.slider("树的数量", 50, 500, params.get('n_estimators', 200), 10, key=f"n_est_{model_name}")
+                params['max_depth'] = st.slider("最大深度", 3, 15, params.get('max_depth', 7), key=f"depth_{model_name}")
+            params['learning_rate'] = st.slider("学习率", 0.01, 0.2, params.get('learning_rate', 0.05), 0.01, key=f"lr_{model_name}")
+        elif "ALSTM" in model_name:
+            st.info("ALSTM模型的超参数调节暂未在此界面支持。")
+    st.session_state.train_params = params
+    return params
+
+@st.fragment
+def _training_fragment(qlib_dir, models_save_dir, model_name, factor_name, stock_pool, dates, custom_model_name, finetune_model_path):
+    """
+    The training button, job polling and log panel. While a job runs, polling reruns
+    only this fragment instead of every form widget above it.
+    """
+    train_start, train_end, valid_start, valid_end, test_start, test_end = dates
+
+    with st.container(height=400):
+        log_placeholder = st.empty()
+        if st.session_state.training_log:
+            log_placeholder.code("\n".join(st.session_state.training_log), language='log')
+        else:
+            log_placeholder.code("训练日志将显示在此处", language='log')
+
+    training_running = "train_job" in st.session_state
+    if st.button("开始训练", key="btn_train", disabled=training_running):
+        st.session_state.training_status = None # Reset status on new run
+        st.session_state.training_log.clear() # Clear log from session state
+        log_placeholder.empty() # Clear previous logs from the placeholder
 
+        try:
+            # --- Config modification for time ranges ---
+            all_dates = [train_start, train_end, valid_start, valid_end, test_start, test_end]
+            if any(d is None for d in all_dates):
+                raise ValueError("所有日期都必须设置。")
+            if not (train_start < train_end < valid_start < valid_end < test_start < test_end):
+                st.error("日期区间设置错误：必须遵循 训练 < 验证 < 测试 的顺序，且开始日期不能晚于结束日期。")
+                raise ValueError("日期顺序不正确。")
+
+            # Build segments and params for new train_model signature
+            train_start_str, train_end_str = train_start.isoformat(), train_end.isoformat()
+            valid_start_str, valid_end_str = valid_start.isoformat(), valid_end.isoformat()
+            test_start_str, test_end_str = test_start.isoformat(), test_end.isoformat()
+
+            segments = {
+                "train": (train_start_str, train_end_str),
+                "valid": (valid_start_str, valid_end_str),
+                "test": (test_start_str, test_end_str)
+            }
+
+            # Read at click time: slider changes only rerun _hparam_fragment, not the page
+            model_params = st.session_state.train_params
+
+            # Training runs in the background so the rest of the app stays usable
+            job_log = _JobLog()
+            _start_job(
+                "train_job", train_model,
+                qlib_dir=qlib_dir,
+                models_save_dir=models_save_dir,
+                model_name=model_name,
+                factor_name=factor_name,
+                stock_pool=stock_pool,
+                segments=segments,
+                model_params=model_params,
+                custom_model_name=custom_model_name if custom_model_name else None,
+                finetune_model_path=finetune_model_path,
+                log_placeholder=job_log,
+                job_log=job_log
+            )
+        except Exception as e:
+            st.session_state.training_status = {"status": "error", "message": f"训练过程中发生错误: {e}"}
+
+    if "train_job" in st.session_state:
+        st.info("正在后台训练模型，此过程可能需要较长时间。您可以切换到其他页面，稍后回来查看结果。")
+    future = _poll_job("train_job", log_placeholder)
+    if future is not None:
+        try:
+            saved_path, training_log = future.result()
+            st.session_state.training_status = {"status": "success", "message": f"模型训练成功！已保存至: {saved_path}"}
+            st.session_state.training_log.extend(training_log) # Save for persistence if needed
+        except Exception as e:
+            st.session_state.training_status = {"status": "error", "message": f"训练过程中发生错误: {e}"}
+            # The log placeholder already contains the error details from the redirected stderr
+
+    if st.session_state.training_status:
+        status = st.session_state.training_status
+        if status["status"] == "success":
+            st.success(status["message"])
+            st.balloons()
+        elif status["status"] == "error":
+            st.error(status["message"])
+
+@st.fragment
 def model_training_page():
     st.header("模型训练")
     with st.expander("💡 操作指南 (Operation Guide)"):
@@ -159,10 +594,10 @@ def model_training_page():
     if "training_status" not in st.session_state:
         st.session_state.training_status = None
     if "training_log" not in st.session_state:
-        st.session_state.training_log = ""
+        st.session_state.training_log = deque(maxlen=LOG_MAX_LINES)
 
-    qlib_dir = st.session_state.settings.get("qlib_data_path", str(Path.home() / ".qlib" / "qlib_data" / "cn_data"))
-    models_save_dir = st.session_state.settings.get("models_path", str(Path.home() / "qlib_models"))
+    qlib_dir = st.session_state.settings.get("qlib_data_path", _DEFAULT_QLIB_CN_DIR)
+    models_save_dir = st.session_state.settings.get("models_path", _DEFAULT_MODELS_DIR)
     st.info(f"当前Qlib数据路径: `{qlib_dir}`")
     st.info(f"当前模型存读路径: `{models_save_dir}` (可在左侧边栏修改)")
 
@@ -170,8 +605,7 @@ def model_training_page():
     train_mode = st.radio("选择训练模式", ["从零开始新训练", "在旧模型上继续训练 (Finetune)"], key="train_mode", horizontal=True, on_change=lambda: setattr(st.session_state, 'training_status', None))
     finetune_model_path = None
     if train_mode == "在旧模型上继续训练 (Finetune)":
-        finetune_dir_path = Path(models_save_dir).expanduser()
-        available_finetune_models = [f.name for f in finetune_dir_path.glob("*.pkl")] if finetune_dir_path.exists() else []
+        finetune_dir_path, available_finetune_models = _available_models(models_save_dir)
         if available_finetune_models:
             selected_finetune_model = st.selectbox("选择一个要继续训练的模型", available_finetune_models)
             finetune_model_path = str(finetune_dir_path / selected_finetune_model)
@@ -180,13 +614,17 @@ def model_training_page():
             return
 
     col1, col2 = st.columns(2)
-    model_name = col1.selectbox("选择模型", list(MODELS.keys()))
-    factor_name = col2.selectbox("选择因子", list(FACTORS.keys()))
+    model_name = col1.selectbox("选择模型", _MODEL_NAMES)
+    factor_name = col2.selectbox("选择因子", _FACTOR_NAMES)
 
     # Dynamically create stock pool selection
-    summary = get_data_summary(qlib_dir)
+    summary = _cached_data_summary(qlib_dir, _data_mtime(qlib_dir))
     instrument_list = summary.get("instruments")
-    if instrument_list:
+    if instrument_list and len(instrument_list) > SELECTBOX_MAX_OPTIONS:
+        # Very long option lists make the selectbox slow to render, so only offer the first ones
+        stock_pool = st.selectbox("选择股票池", options=instrument_list[:SELECTBOX_MAX_OPTIONS], help=f"仅列出前 {SELECTBOX_MAX_OPTIONS} 个扫描到的股票池，其余的请在下方输入。")
+        stock_pool = st.text_input("或直接输入股票池名称", "").strip() or stock_pool
+    elif instrument_list:
         stock_pool = st.selectbox("选择股票池", options=instrument_list, help="这是从您的数据目录中自动扫描到的股票池列表。")
     else:
         st.warning("未在您的数据目录中扫描到股票池文件。请手动输入股票池名称。")
@@ -206,31 +644,30 @@ def model_training_page():
         valid_end = c2.date_input("验证结束", datetime.date(2021, 12, 31))
         c1, c2 = st.columns(2)
         test_start = c1.date_input("测试开始", datetime.date(2022, 1, 1))
-        test_end = c2.date_input("测试结束", datetime.date.today() - datetime.timedelta(days=1))
+        test_end = c2.date_input("测试结束", datetime.date.today() - _ONE_DAY)
 
 
     st.subheader("3. 超参数调节")
     use_gpu = st.checkbox("尝试使用GPU加速 (如果可用)", value=False, help="如果您的LightGBM/XGBoost已正确配置GPU支持，勾选此项可以大幅提速。")
 
-    params = copy.deepcopy(MODELS[model_name]["kwargs"])
+    # Model kwargs are flat scalars and only top-level keys are overwritten below, so a
+    # shallow copy keeps MODELS intact (train_model deep-copies the config itself)
+    params = dict(MODELS[model_name]["kwargs"])
     if use_gpu:
         params['device'] = 'gpu'
-
-    with st.expander("调节模型参数", expanded=True):
-        if any(m in model_name for m in ["LightGBM", "XGBoost", "CatBoost"]):
-            # Add n_jobs here for parallel processing
-            if not use_gpu: # n_jobs is for CPU parallelism
-                params['n_jobs'] = st.number_input("并行计算线程数 (n_jobs)", -1, 16, -1, help="设置用于并行计算的线程数。-1 表示使用所有可用的CPU核心。")
-
-            if "CatBoost" in model_name:
-                params['iterations'] = st.slider("迭代次数", 50, 500, params.get('iterations', 200), 10, key=f"it_{model_name}")
-                params['depth'] = st.slider("最大深度", 3, 15, params.get('depth', 7), key=f"depth_{model_name}")
-            else:
-                params['n_estimators'] = st.slider("树的数量", 50, 500, params.get('n_estimators', 200), 10, key=f"n_est_{model_name}")
-                params['max_depth'] = st.slider("最大深度", 3, 15, params.get('max_depth', 7), key=f"depth_{model_name}")
-            params['learning_rate'] = st.slider("学习率", 0.01, 0.2, params.get('learning_rate', 0.05), 0.01, key=f"lr_{model_name}")
-        elif "ALSTM" in model_name:
-            st.info("ALSTM模型的超参数调节暂未在此界面支持。")
+        if "LightGBM" in model_name:
+            params['device'] = _lgb_gpu_mode()
+            st.caption(f"LightGBM GPU 后端: `{params['device']}`" + (" (CUDA)" if params['device'] == 'cuda' else " (OpenCL)"))
+            # LightGBM's GPU learner is only faster than CPU with a small max_bin
+            g1, g2, g3 = st.columns(3)
+            if params['device'] == 'gpu':
+                params['gpu_platform_id'] = g1.number_input("GPU 平台 ID", 0, 8, 0, help="OpenCL 平台编号，通常为 0。")
+            params['gpu_device_id'] = g2.number_input("GPU 设备 ID", 0, 8, 0, help="所选平台上的显卡编号，通常为 0。")
+            params['max_bin'] = g3.number_input("max_bin", 15, 255, 63, help="GPU 训练建议使用较小的值 (如 63)，过大会使GPU比CPU更慢。")
+            if params['device'] == 'gpu':
+                params['gpu_use_dp'] = False # Single precision histograms are much faster on consumer GPUs
+
+    _hparam_fragment(model_name, use_gpu, params)
 
     st.subheader("4. 开始训练与日志")
     st.warning("""
@@ -246,106 +683,16 @@ def model_training_page():
     - **硬件升级**: 如果需要处理大规模数据，请在具有更大内存（RAM）的机器上运行。
     """)
 
-    with st.container(height=400):
-        log_placeholder = st.empty()
-        if st.session_state.training_log:
-            log_placeholder.code(st.session_state.training_log, language='log')
-        else:
-            log_placeholder.code("训练日志将显示在此处", language='log')
+    _training_fragment(
+        qlib_dir, models_save_dir, model_name, factor_name, stock_pool,
+        (train_start, train_end, valid_start, valid_end, test_start, test_end),
+        custom_model_name, finetune_model_path,
+    )
 
-    if st.button("开始训练", key="btn_train"):
-        st.session_state.training_status = None # Reset status on new run
-        st.session_state.training_log = "" # Clear log from session state
-        log_placeholder.empty() # Clear previous logs from the placeholder
-
-        with st.spinner("正在训练模型，此过程可能需要较长时间，请耐心等待..."):
-            try:
-                # --- Config modification for time ranges ---
-                all_dates = [train_start, train_end, valid_start, valid_end, test_start, test_end]
-                if any(d is None for d in all_dates):
-                    raise ValueError("所有日期都必须设置。")
-                if not (train_start < train_end < valid_start < valid_end < test_start < test_end):
-                    st.error("日期区间设置错误：必须遵循 训练 < 验证 < 测试 的顺序，且开始日期不能晚于结束日期。")
-                    raise ValueError("日期顺序不正确。")
-
-                # Build segments and params for new train_model signature
-                train_start_str, train_end_str = train_start.strftime("%Y-%m-%d"), train_end.strftime("%Y-%m-%d")
-                valid_start_str, valid_end_str = valid_start.strftime("%Y-%m-%d"), valid_end.strftime("%Y-%m-%d")
-                test_start_str, test_end_str = test_start.strftime("%Y-%m-%d"), test_end.strftime("%Y-%m-%d")
-
-                segments = {
-                    "train": (train_start_str, train_end_str),
-                    "valid": (valid_start_str, valid_end_str),
-                    "test": (test_start_str, test_end_str)
-                }
-
-                model_params = params # `params` is already updated by the sliders
-
-                saved_path, training_log = train_model(
-                    qlib_dir=qlib_dir,
-                    models_save_dir=models_save_dir,
-                    model_name=model_name,
-                    factor_name=factor_name,
-                    stock_pool=stock_pool,
-                    segments=segments,
-                    model_params=model_params,
-                    custom_model_name=custom_model_name if custom_model_name else None,
-                    finetune_model_path=finetune_model_path,
-                    log_placeholder=log_placeholder
-                )
-                st.session_state.training_status = {"status": "success", "message": f"模型训练成功！已保存至: {saved_path}"}
-                st.session_state.training_log = training_log # Save for persistence if needed
-            except Exception as e:
-                st.session_state.training_status = {"status": "error", "message": f"训练过程中发生错误: {e}"}
-                # The log placeholder already contains the error details from the redirected stderr
-
-    if st.session_state.training_status:
-        status = st.session_state.training_status
-        if status["status"] == "success":
-            st.success(status["message"])
-            st.balloons()
-        elif status["status"] == "error":
-            st.error(status["message"])
-
-def prediction_page():
-    st.header("投资组合预测")
-    with st.expander("💡 操作指南 (Operation Guide)"):
-        st.markdown("""
-        **本页面利用已训练好的模型进行预测，帮助您分析和比较模型的预测结果。**
-
-        **- 核心作用:**
-          - **横向对比**: 在同一天，用多个不同的模型对全市场或特定股票池的股票进行打分，直观地比较哪个模型表现更好。
-          - **纵向分析**: 追踪单个模型对某一只特定股票在一段时间内的评分变化，以判断模型对该股票的看法是否稳定、是否存在趋势。
-
-        **- 功能解释:**
-          - **1. 多模型对比预测 (单日)**:
-            - **用途**: 用于模型“选美”。例如，您用不同参数训练了三个LightGBM模型，您想知道在`2023-01-05`这一天，哪个模型选出的股票表现最好。
-            - **操作**: 选择一个或多个您想要对比的模型，选择一个预测日期，然后点击“执行对比预测”。
-            - **结果**: 会生成一个包含所有模型打分的数据表，并绘制一张条形图，展示综合评分最高的10只股票以及每个模型对它们的具体打分。
-          - **2. 单一股票历史分数追踪**:
-            - **用途**: 用于深度分析单个模型对某只股票的“偏见”或“看法”。例如，您想知道您训练的模型是否长期看好贵州茅台（SH600519）。
-            - **操作**: 选择一个模型，输入您关心的股票代码（如`SH600519`），选择一个历史时间段，然后点击“开始追踪”。
-            - **结果**: 会生成一张折线图，展示在该时间段内，模型每天对这只股票的评分。如果分数持续走高，说明模型近期看好该股票。
-
-        **- 注意事项:**
-          - 历史分数追踪功能需要对时间范围内的每一天都进行一次预测，因此如果时间跨度太长，可能会比较耗时。
-        """)
-
-    # Initialize session state
-    if "pred_results" not in st.session_state:
-        st.session_state.pred_results = None
-    if "hist_results" not in st.session_state:
-        st.session_state.hist_results = None
-
-    qlib_dir = st.session_state.settings.get("qlib_data_path", str(Path.home() / ".qlib" / "qlib_data" / "cn_data"))
-    models_dir = st.session_state.settings.get("models_path", str(Path.home() / "qlib_models"))
-    st.info(f"当前Qlib数据路径: `{qlib_dir}`")
-    st.info(f"当前模型加载路径: `{models_dir}` (可在左侧边栏修改)")
-    models_dir_path = Path(models_dir).expanduser()
-    available_models = [f.name for f in models_dir_path.glob("*.pkl")] if models_dir_path.exists() else []
-    if not available_models:
-        st.warning(f"在 '{models_dir_path}' 中未找到模型。")
-        return
+@st.fragment
+def _compare_models_fragment(qlib_dir: str, models_dir_path: Path, available_models: list):
+    """Section 1 of the prediction page: single-day predictions from several models side by side."""
+    import plotly.express as px
 
     st.subheader("1. 多模型对比预测 (单日)")
     selected_models = st.multiselect("选择一个或多个模型进行对比预测", available_models)
@@ -355,58 +702,85 @@ def prediction_page():
             st.markdown("**已选模型信息:**")
             for model_name in selected_models:
                 model_path = str(models_dir_path / model_name)
-                info = get_model_info(model_path)
+                info = _cached_model_info(model_path, _path_mtime(Path(model_path).with_suffix(".yaml")))
                 stock_pool = info.get('stock_pool', '未知')
                 if info.get("error"):
                     st.warning(f"- **{model_name}**: 无法加载信息 ({info['error']})")
                 else:
                     st.markdown(f"- **{model_name}**: 预测股票池 `{stock_pool}`")
 
-    prediction_date = st.date_input("选择预测日期", datetime.date.today() - datetime.timedelta(days=1))
+    today = datetime.date.today()
+    prediction_date = st.date_input("选择预测日期", today - _ONE_DAY)
 
     progress_placeholder = st.empty()
 
     if st.button("执行对比预测", key="btn_pred") and selected_models:
         with st.spinner("正在执行预测..."):
             try:
-                all_preds = []
-                for i, model_name in enumerate(selected_models):
-                    progress_placeholder.text(f"正在预测第 {i+1}/{len(selected_models)} 个模型: {model_name}...")
-                    model_path = str(models_dir_path / model_name)
-                    pred_df = predict(model_path, qlib_dir, prediction_date.strftime("%Y-%m-%d"))
-                    pred_df = pred_df.rename(columns={"score": f"score_{model_name.replace('.pkl', '')}"})
-                    all_preds.append(pred_df.set_index('StockID')[f"score_{model_name.replace('.pkl', '')}"])
-                combined_df = pd.concat(all_preds, axis=1).reset_index()
-                score_cols = [col for col in combined_df.columns if 'score' in col]
-                combined_df['average_score'] = combined_df[score_cols].mean(axis=1)
-                top_10_stocks = combined_df.nlargest(10, 'average_score')
-                plot_df = top_10_stocks.melt(id_vars=['StockID'], value_vars=score_cols, var_name='Model', value_name='Score')
-                plot_df['Model'] = plot_df['Model'].str.replace('score_', '')
+                date_str = prediction_date.isoformat()
+                model_paths = {model_name: str(models_dir_path / model_name) for model_name in selected_models}
+                # One call so models sharing a dataset config reuse the same features
+                progress_placeholder.text(f"正在使用 {len(model_paths)} 个模型进行预测...")
+                try:
+                    batch = _cached_predict_batch(
+                        tuple((path, _path_mtime(path)) for path in model_paths.values()), qlib_dir, date_str
+                    )
+                finally:
+                    progress_placeholder.empty()
+                pred_dfs = {model_name: batch[path] for model_name, path in model_paths.items()}
+
+                # Build the wide score table in one allocation, aligned on StockID
+                scores, model_labels = {}, {}
+                for model_name in selected_models:
+                    label = model_name.replace('.pkl', '')
+                    scores[f"score_{label}"] = pred_dfs[model_name].set_index('StockID')['score']
+                    model_labels[f"score_{label}"] = label
+                combined_df = pd.DataFrame(scores)
+                combined_df.index.name = 'StockID'
+                score_cols = list(scores)
+                # Models may cover different stock pools, so ignore missing scores like DataFrame.mean does
+                combined_df['average_score'] = np.nanmean(combined_df[score_cols].to_numpy(), axis=1)
+                combined_df = combined_df.reset_index()
+                # Top-10 via a linear-time partition instead of sorting the whole universe
+                avg = combined_df['average_score'].to_numpy()
+                valid = np.flatnonzero(~np.isnan(avg))
+                k = min(10, len(valid))
+                top_idx = valid[np.argpartition(-avg[valid], k - 1)[:k]] if k else valid
+                top_idx = top_idx[np.argsort(-avg[top_idx], kind='stable')]
+                top_10_stocks = combined_df.iloc[top_idx]
+                # Relabel the few score columns before melting so the Model column needs no per-row cleanup
+                plot_df = top_10_stocks.rename(columns=model_labels).melt(id_vars='StockID', value_vars=list(model_labels.values()), var_name='Model', value_name='Score')
                 fig = px.bar(plot_df, x="StockID", y="Score", color="Model", barmode='group', title="Top-10 股票多模型分数对比")
-                st.session_state.pred_results = {"df": combined_df, "fig": fig}
+                st.session_state.pred_results = {"table": _arrow_table(combined_df), "fig": fig}
             except Exception as e:
                 st.error(f"预测过程中发生错误: {e}")
                 st.session_state.pred_results = None
 
     if st.session_state.pred_results:
         st.success("预测完成！")
-        st.dataframe(st.session_state.pred_results["df"])
+        st.dataframe(st.session_state.pred_results["table"])
         st.plotly_chart(st.session_state.pred_results["fig"], use_container_width=True)
 
+@st.fragment
+def _history_fragment(qlib_dir: str, models_dir_path: Path, available_models: list):
+    """Section 2 of the prediction page: one model's score history for a single stock."""
+    import plotly.graph_objects as go
+    today = datetime.date.today()
+
     st.subheader("2. 单一股票历史分数追踪")
     col1, col2 = st.columns(2)
     single_model_name = col1.selectbox("选择用于追踪的模型", available_models, key="single_model_select")
 
     if single_model_name:
         model_path = str(models_dir_path / single_model_name)
-        info = get_model_info(model_path)
+        info = _cached_model_info(model_path, _path_mtime(Path(model_path).with_suffix(".yaml")))
         stock_pool = info.get('stock_pool', '未知')
         st.info(f"已选模型 **{single_model_name}** 在股票池 `{stock_pool}` 上进行训练。")
 
     stock_id_input = col2.text_input("输入股票代码 (例如 SH600519)", "SH600519")
     col3, col4 = st.columns(2)
-    hist_start_date = col3.date_input("追踪开始日期", datetime.date.today() - datetime.timedelta(days=90))
-    hist_end_date = col4.date_input("追踪结束日期", datetime.date.today() - datetime.timedelta(days=1))
+    hist_start_date = col3.date_input("追踪开始日期", today - _NINETY_DAYS)
+    hist_end_date = col4.date_input("追踪结束日期", today - _ONE_DAY)
 
     hist_progress_placeholder = st.empty()
 
@@ -418,11 +792,18 @@ def prediction_page():
             with st.spinner(f"正在为股票 {stock_id_input} 获取历史分数..."):
                 try:
                     single_model_path = str(models_dir_path / single_model_name)
-                    hist_df = get_historical_prediction(single_model_path, qlib_dir, stock_id_input.upper(), str(hist_start_date), str(hist_end_date), placeholder=hist_progress_placeholder)
+                    hist_progress_placeholder.text(f"正在构建 {hist_start_date.isoformat()} 至 {hist_end_date.isoformat()} 的特征并预测...")
+                    try:
+                        hist_df = _cached_historical_prediction(single_model_path, _path_mtime(single_model_path), qlib_dir, stock_id_input.upper(), hist_start_date.isoformat(), hist_end_date.isoformat())
+                    finally:
+                        hist_progress_placeholder.empty()
                     if hist_df.empty:
                         st.session_state.hist_results = {"status": "empty"}
                     else:
-                        fig = px.line(hist_df, x="Date", y="Score", title=f"模型 {single_model_name} 对 {stock_id_input} 的历史评分")
+                        # WebGL trace: multi-year daily histories stay responsive
+                        x, y = _downsample_series(hist_df["Date"], hist_df["Score"])
+                        fig = go.Figure(go.Scattergl(x=x, y=y, mode="lines", name="Score"))
+                        fig.update_layout(title=f"模型 {single_model_name} 对 {stock_id_input} 的历史评分", xaxis_title="Date", yaxis_title="Score")
                         st.session_state.hist_results = {"df": hist_df, "fig": fig, "status": "ok"}
                 except Exception as e:
                     st.error(f"历史分数追踪过程中发生错误: {e}")
@@ -435,7 +816,97 @@ def prediction_page():
         elif st.session_state.hist_results["status"] == "empty":
             st.warning("在指定时间段内未能获取到该股票的有效预测分数。")
 
+@st.fragment
+def prediction_page():
+    st.header("投资组合预测")
+    with st.expander("💡 操作指南 (Operation Guide)"):
+        st.markdown("""
+        **本页面利用已训练好的模型进行预测，帮助您分析和比较模型的预测结果。**
+
+        **- 核心作用:**
+          - **横向对比**: 在同一天，用多个不同的模型对全市场或特定股票池的股票进行打分，直观地比较哪个模型表现更好。
+          - **纵向分析**: 追踪单个模型对某一只特定股票在一段时间内的评分变化，以判断模型对该股票的看法是否稳定、是否存在趋势。
+
+        **- 功能解释:**
+          - **1. 多模型对比预测 (单日)**:
+            - **用途**: 用于模型“选美”。例如，您用不同参数训练了三个LightGBM模型，您想知道在`2023-01-05`这一天，哪个模型选出的股票表现最好。
+            - **操作**: 选择一个或多个您想要对比的模型，选择一个预测日期，然后点击“执行对比预测”。
+            - **结果**: 会生成一个包含所有模型打分的数据表，并绘制一张条形图，展示综合评分最高的10只股票以及每个模型对它们的具体打分。
+          - **2. 单一股票历史分数追踪**:
+            - **用途**: 用于深度分析单个模型对某只股票的“偏见”或“看法”。例如，您想知道您训练的模型是否长期看好贵州茅台（SH600519）。
+            - **操作**: 选择一个模型，输入您关心的股票代码（如`SH600519`），选择一个历史时间段，然后点击“开始追踪”。
+            - **结果**: 会生成一张折线图，展示在该时间段内，模型每天对这只股票的评分。如果分数持续走高，说明模型近期看好该股票。
+
+        **- 注意事项:**
+          - 历史分数追踪会对整个时间范围一次性构建特征并完成预测，时间跨度越长，所需的时间和内存也越多。
+        """)
+
+    # Initialize session state
+    if "pred_results" not in st.session_state:
+        st.session_state.pred_results = None
+    if "hist_results" not in st.session_state:
+        st.session_state.hist_results = None
+
+    qlib_dir = st.session_state.settings.get("qlib_data_path", _DEFAULT_QLIB_CN_DIR)
+    models_dir = st.session_state.settings.get("models_path", _DEFAULT_MODELS_DIR)
+    st.info(f"当前Qlib数据路径: `{qlib_dir}`")
+    st.info(f"当前模型加载路径: `{models_dir}` (可在左侧边栏修改)")
+    models_dir_path, available_models = _available_models(models_dir)
+    if not available_models:
+        st.warning(f"在 '{models_dir_path}' 中未找到模型。")
+        return
+
+    # Each section is its own fragment, so working in one does not re-send the other's chart
+    _compare_models_fragment(qlib_dir, models_dir_path, available_models)
+    _history_fragment(qlib_dir, models_dir_path, available_models)
+
+
+def _backtest_kpis(daily_report_df: pd.DataFrame, analysis_df: pd.DataFrame) -> dict:
+    """Formats the KPI row once when a backtest finishes, so reruns only read strings."""
+    metrics = analysis_df.loc["excess_return_with_cost"]
+    if isinstance(metrics, pd.DataFrame):
+        # risk_analysis reports a single "risk" column indexed by metric name
+        metrics = metrics["risk"]
+    if "turnover" in daily_report_df:
+        turnover = np.nanmean(daily_report_df["turnover"].to_numpy(dtype=float))
+    else:
+        turnover = metrics.get("turnover_rate", float("nan"))
+    return {
+        "ann": f"{metrics['annualized_return']:.2%}",
+        "ir": f"{metrics['information_ratio']:.2f}",
+        "mdd": f"{metrics['max_drawdown']:.2%}",
+        "to": f"{turnover:.3f}",
+    }
+
+@st.fragment
+def _backtest_params_fragment():
+    """
+    Renders the backtest date, strategy and trading inputs and stores their values in
+    `st.session_state.bt_params`. Editing them reruns only this block, not the results below.
+    """
+    st.subheader("回测参数配置")
+    col1, col2 = st.columns(2)
+    today = datetime.date.today()
+    start_date = col1.date_input("开始日期", today - _ONE_YEAR)
+    end_date = col2.date_input("结束日期", today - _ONE_DAY)
+    st.subheader("策略参数 (Top-K Dropout)")
+    c1, c2 = st.columns(2)
+    topk = c1.number_input("买入Top-K只股票", 1, 100, 50)
+    n_drop = c2.number_input("持有期(天)", 1, 20, 5)
+    st.subheader("交易参数")
+    c1, c2, c3 = st.columns(3)
+    open_cost = c1.number_input("开仓手续费率", 0.0, 0.01, 0.0005, format="%.4f")
+    close_cost = c2.number_input("平仓手续费率", 0.0, 0.01, 0.0015, format="%.4f")
+    min_cost = c3.number_input("最低手续费", 0, 10, 5)
+    st.session_state.bt_params = {
+        "start_date": start_date, "end_date": end_date, "topk": topk, "n_drop": n_drop,
+        "open_cost": open_cost, "close_cost": close_cost, "min_cost": min_cost,
+    }
+
+@st.fragment
 def backtesting_page():
+    import plotly.graph_objects as go
+
     st.header("策略回测")
     with st.expander("💡 操作指南 (Operation Guide)"):
         st.markdown("""
@@ -469,71 +940,91 @@ def backtesting_page():
     if "backtest_results" not in st.session_state:
         st.session_state.backtest_results = None
 
-    qlib_dir = st.session_state.settings.get("qlib_data_path", str(Path.home() / ".qlib" / "qlib_data" / "cn_data"))
-    models_dir = st.session_state.settings.get("models_path", str(Path.home() / "qlib_models"))
+    qlib_dir = st.session_state.settings.get("qlib_data_path", _DEFAULT_QLIB_CN_DIR)
+    models_dir = st.session_state.settings.get("models_path", _DEFAULT_MODELS_DIR)
     st.info(f"当前Qlib数据路径: `{qlib_dir}`")
     st.info(f"当前模型加载路径: `{models_dir}` (可在左侧边栏修改)")
-    models_dir_path = Path(models_dir).expanduser()
-    available_models = [f.name for f in models_dir_path.glob("*.pkl")] if models_dir_path.exists() else []
+    models_dir_path, available_models = _available_models(models_dir)
     if not available_models:
         st.warning(f"在 '{models_dir_path}' 中未找到模型。")
         return
     selected_model_name = st.selectbox("选择一个模型文件进行回测", available_models)
     selected_model_path = str(models_dir_path / selected_model_name)
-    st.subheader("回测参数配置")
-    col1, col2 = st.columns(2)
-    start_date = col1.date_input("开始日期", datetime.date.today() - datetime.timedelta(days=365))
-    end_date = col2.date_input("结束日期", datetime.date.today() - datetime.timedelta(days=1))
-    st.subheader("策略参数 (Top-K Dropout)")
-    c1, c2 = st.columns(2)
-    topk = c1.number_input("买入Top-K只股票", 1, 100, 50)
-    n_drop = c2.number_input("持有期(天)", 1, 20, 5)
-    st.subheader("交易参数")
-    c1, c2, c3 = st.columns(3)
-    open_cost = c1.number_input("开仓手续费率", 0.0, 0.01, 0.0005, format="%.4f")
-    close_cost = c2.number_input("平仓手续费率", 0.0, 0.01, 0.0015, format="%.4f")
-    min_cost = c3.number_input("最低手续费", 0, 10, 5)
-    if st.button("开始回测", key="btn_bt"):
+    _backtest_params_fragment()
+    # Read at run time: edits inside the fragment above only rerun the fragment
+    bt_params = st.session_state.bt_params
+    start_date, end_date = bt_params["start_date"], bt_params["end_date"]
+    topk, n_drop = bt_params["topk"], bt_params["n_drop"]
+    open_cost, close_cost, min_cost = bt_params["open_cost"], bt_params["close_cost"], bt_params["min_cost"]
+    if st.button("开始回测", key="btn_bt", disabled="backtest_job" in st.session_state):
         if start_date >= end_date:
             st.error("开始日期必须早于结束日期！")
             st.session_state.backtest_results = None
         else:
             strategy_kwargs = {"topk": topk, "n_drop": n_drop}
             exchange_kwargs = {"open_cost": open_cost, "close_cost": close_cost, "min_cost": min_cost, "deal_price": "close"}
-            with st.spinner("正在回测..."):
-                try:
-                    # backtest_strategy now returns two dataframes: one for daily values, one for analysis
-                    daily_report_df, analysis_df = backtest_strategy(
-                        selected_model_path, qlib_dir,
-                        start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"),
-                        strategy_kwargs, exchange_kwargs
-                    )
-                    # The plot should only use the daily report
-                    fig = px.line(daily_report_df, x=daily_report_df.index, y=['account', 'bench'], title="策略 vs. 基准")
-                    st.session_state.backtest_results = {"daily": daily_report_df, "analysis": analysis_df, "fig": fig}
-                except Exception as e:
-                    st.error(f"回测过程中发生错误: {e}")
-                    st.session_state.backtest_results = None
+            st.session_state.backtest_results = None
+            try:
+                # backtest_strategy now returns two dataframes: one for daily values, one for analysis
+                _start_job(
+                    "backtest_job", _cached_backtest,
+                    selected_model_path, _path_mtime(selected_model_path),
+                    qlib_dir, _data_mtime(qlib_dir),
+                    start_date.isoformat(), end_date.isoformat(),
+                    tuple(sorted(strategy_kwargs.items())), tuple(sorted(exchange_kwargs.items()))
+                )
+            except Exception as e:
+                st.error(f"回测过程中发生错误: {e}")
+
+    if "backtest_job" in st.session_state:
+        st.info("正在后台回测...")
+    future = _poll_job("backtest_job")
+    if future is not None:
+        try:
+            daily_report_df, analysis_df = future.result()
+            # The plot should only use the daily report
+            # WebGL traces keep long daily backtests responsive in the browser
+            fig = go.Figure()
+            for col in ['account', 'bench']:
+                x, y = _downsample_series(daily_report_df.index, daily_report_df[col])
+                fig.add_trace(go.Scattergl(x=x, y=y, mode='lines', name=col))
+            fig.update_layout(title="策略 vs. 基准")
+            st.session_state.backtest_results = {
+                "fig": fig, "analysis_table": _arrow_table(analysis_df),
+                "kpis": _backtest_kpis(daily_report_df, analysis_df),
+            }
+        except Exception as e:
+            st.error(f"回测过程中发生错误: {e}")
+            st.session_state.backtest_results = None
 
     if st.session_state.backtest_results:
         st.success("回测完成！")
         st.subheader("绩效指标")
-        # Metrics are now in the 'analysis' dataframe
-        analysis_df = st.session_state.backtest_results["analysis"]
-        metrics = analysis_df.loc["excess_return_with_cost"]
+        kpis = st.session_state.backtest_results["kpis"]
         kpi_cols = st.columns(4)
-        kpi_cols[0].metric("年化收益率", f"{metrics['annualized_return']:.2%}")
-        kpi_cols[1].metric("信息比率", f"{metrics['information_ratio']:.2f}")
-        kpi_cols[2].metric("最大回撤", f"{metrics['max_drawdown']:.2%}")
-        kpi_cols[3].metric("换手率", f"{metrics['turnover_rate']:.2f}")
+        kpi_cols[0].metric("年化收益率", kpis["ann"])
+        kpi_cols[1].metric("信息比率", kpis["ir"])
+        kpi_cols[2].metric("最大回撤", kpis["mdd"])
+        kpi_cols[3].metric("换手率", kpis["to"])
 
         st.subheader("资金曲线")
         st.plotly_chart(st.session_state.backtest_results["fig"], use_container_width=True)
 
         with st.expander("查看详细分析报告"):
             with st.container(height=300):
-                st.dataframe(analysis_df)
-
+                st.dataframe(st.session_state.backtest_results["analysis_table"])
+
+def _eval_kpis(portfolio_report: pd.DataFrame) -> dict:
+    """Formats the evaluation KPI row once, so the report frame need not be kept for reruns."""
+    metrics = portfolio_report.loc["excess_return_with_cost"]
+    return {
+        "ann": f"{metrics['annualized_return']:.2%}",
+        "ir": f"{metrics['information_ratio']:.2f}",
+        "mdd": f"{metrics['max_drawdown']:.2%}",
+        "to": f"{metrics['turnover_rate']:.2f}",
+    }
+
+@st.fragment
 def model_evaluation_page():
     st.header("模型评估")
     with st.expander("💡 操作指南 (Operation Guide)"):
@@ -568,14 +1059,13 @@ def model_evaluation_page():
     if "eval_results" not in st.session_state:
         st.session_state.eval_results = None
     if "evaluation_log" not in st.session_state:
-        st.session_state.evaluation_log = ""
+        st.session_state.evaluation_log = deque(maxlen=LOG_MAX_LINES)
 
-    qlib_dir = st.session_state.settings.get("qlib_data_path", str(Path.home() / ".qlib" / "qlib_data" / "cn_data"))
-    models_dir = st.session_state.settings.get("models_path", str(Path.home() / "qlib_models"))
+    qlib_dir = st.session_state.settings.get("qlib_data_path", _DEFAULT_QLIB_CN_DIR)
+    models_dir = st.session_state.settings.get("models_path", _DEFAULT_MODELS_DIR)
     st.info(f"当前Qlib数据路径: `{qlib_dir}`")
     st.info(f"当前模型加载路径: `{models_dir}` (可在左侧边栏修改)")
-    models_dir_path = Path(models_dir).expanduser()
-    available_models = [f.name for f in models_dir_path.glob("*.pkl")] if models_dir_path.exists() else []
+    models_dir_path, available_models = _available_models(models_dir)
     if not available_models:
         st.warning(f"在 '{models_dir_path}' 中未找到模型。")
         return
@@ -586,56 +1076,109 @@ def model_evaluation_page():
     with st.container(height=400):
         log_placeholder = st.empty()
         if st.session_state.evaluation_log:
-            log_placeholder.code(st.session_state.evaluation_log, language='log')
+            log_placeholder.code("\n".join(st.session_state.evaluation_log), language='log')
         else:
             log_placeholder.code("评估日志将显示在此处", language='log')
 
 
-    if st.button("开始评估", key="btn_eval"):
+    if st.button("开始评估", key="btn_eval", disabled="eval_job" in st.session_state):
         if not selected_model_name:
             st.warning("请选择一个模型。")
             st.session_state.eval_results = None
         else:
-            st.session_state.evaluation_log = "" # Clear previous logs
+            st.session_state.evaluation_log.clear() # Clear previous logs
+            st.session_state.eval_results = None
             log_placeholder.empty()
-            with st.spinner("正在执行评估，这可能需要几分钟时间..."):
-                try:
-                    model_path = str(models_dir_path / selected_model_name)
-                    results, eval_log = evaluate_model(model_path, qlib_dir, log_placeholder=log_placeholder)
-                    st.session_state.eval_results = results
-                    st.session_state.evaluation_log = eval_log
-                except Exception as e:
-                    st.error(f"评估过程中发生错误: {e}")
-                    # The log placeholder already contains the error details
-                    st.session_state.eval_results = None
+            try:
+                model_path = str(models_dir_path / selected_model_name)
+                job_log = _JobLog()
+                _start_job(
+                    "eval_job", _cached_evaluation,
+                    model_path, _path_mtime(model_path), qlib_dir, _data_mtime(qlib_dir),
+                    _log_placeholder=job_log, job_log=job_log
+                )
+            except Exception as e:
+                st.error(f"评估过程中发生错误: {e}")
+
+    if "eval_job" in st.session_state:
+        st.info("正在后台执行评估，这可能需要几分钟时间...")
+    future = _poll_job("eval_job", log_placeholder)
+    if future is not None:
+        try:
+            results, eval_log = future.result()
+            # Keep only what the page renders, so each report is held once
+            st.session_state.eval_results = {
+                "signal_table": _arrow_table(results["signal"]),
+                "portfolio_table": _arrow_table(results["portfolio"]),
+                "kpis": _eval_kpis(results["portfolio"]),
+            }
+            st.session_state.evaluation_log.extend(eval_log)
+        except Exception as e:
+            st.error(f"评估过程中发生错误: {e}")
+            # The log placeholder already contains the error details
+            st.session_state.eval_results = None
 
     if st.session_state.eval_results:
         st.success("模型评估完成！")
 
         st.subheader("1. 信号分析 (Signal Analysis)")
-        signal_report = st.session_state.eval_results["signal"]
-        st.dataframe(signal_report)
+        st.dataframe(st.session_state.eval_results["signal_table"])
 
         st.subheader("2. 组合分析 (Portfolio Analysis)")
-        portfolio_report = st.session_state.eval_results["portfolio"]
+        kpis = st.session_state.eval_results["kpis"]
 
         st.markdown("**关键绩效指标 (KPIs)**")
-        metrics = portfolio_report.loc["excess_return_with_cost"]
         kpi_cols = st.columns(4)
-        kpi_cols[0].metric("年化收益率", f"{metrics['annualized_return']:.2%}")
-        kpi_cols[1].metric("夏普比率", f"{metrics['information_ratio']:.2f}")
-        kpi_cols[2].metric("最大回撤", f"{metrics['max_drawdown']:.2%}")
-        kpi_cols[3].metric("换手率", f"{metrics['turnover_rate']:.2f}")
+        kpi_cols[0].metric("年化收益率", kpis["ann"])
+        kpi_cols[1].metric("夏普比率", kpis["ir"])
+        kpi_cols[2].metric("最大回撤", kpis["mdd"])
+        kpi_cols[3].metric("换手率", kpis["to"])
 
         st.markdown("**详细回测报告**")
-        st.dataframe(portfolio_report)
+        st.dataframe(st.session_state.eval_results["portfolio_table"])
+
+@st.fragment
+def _sidebar_paths():
+    """
+    Renders the path settings as a form: edits are only submitted (applied and saved)
+    by the button, so typing a path never reruns the app or the pages behind it.
+    """
+    st.title("路径设置")
+    st.info("修改路径后，点击下方按钮应用到所有页面并保存。")
+
+    if st.session_state.pop("paths_saved", False):
+        st.success("路径已保存!")
+
+    default_qlib_data_path = st.session_state.settings.get("qlib_data_path", _DEFAULT_QLIB_DIR)
+    default_models_path = st.session_state.settings.get("models_path", _DEFAULT_MODELS_DIR)
+
+    # st.session_state.settings, which every page reads, is only updated on submit
+    with st.form("paths_form", border=False):
+        staged_qlib_data_path = st.text_input("Qlib 数据存储根路径", value=default_qlib_data_path, key="qlib_data_path_staged")
+        staged_models_path = st.text_input("模型保存/加载根路径", value=default_models_path, key="models_path_staged")
+        submitted = st.form_submit_button("保存当前路径设置")
+
+    if submitted:
+        staged = {"qlib_data_path": staged_qlib_data_path, "models_path": staged_models_path}
+        changed = any(st.session_state.settings.get(k) != v for k, v in staged.items())
+        st.session_state.settings.update(staged)
+        save_settings(st.session_state.settings)
+        _settings_singleton.clear()
+        # Saving doubles as a manual refresh of the model listings
+        _list_pkl.clear()
+        if changed:
+            # The pages depend on these paths, so rerun the whole app rather than just this fragment
+            st.session_state.paths_saved = True
+            st.rerun()
+        st.success("路径已保存!")
 
 def main():
     st.set_page_config(layout="wide", page_title="Qlib 可视化工具")
 
     # --- Settings Initialization ---
     if 'settings' not in st.session_state:
-        st.session_state.settings = load_settings()
+        # Copy, since the cached dict is shared by every session in this process
+        st.session_state.settings = _settings_singleton().copy()
 
     st.sidebar.image("https://avatars.githubusercontent.com/u/65423353?s=200&v=4", width=100)
     st.sidebar.title("Qlib 可视化面板")
@@ -645,25 +1188,8 @@ def main():
     page = st.sidebar.radio("选择功能页面", page_options)
 
     # --- Settings Persistence ---
-    st.sidebar.title("路径设置")
-    st.sidebar.info("在这里修改的路径会在所有页面生效。点击下方按钮以保存。")
-
-    # We use a trick here: the text_input's key is the same as the settings key.
-    # The on_change callback updates the session_state.settings dict.
-    # This makes the code cleaner as we don't need to handle each input individually.
-    def update_setting(key):
-        st.session_state.settings[key] = st.session_state[key]
-
-    # Get default paths
-    default_qlib_data_path = st.session_state.settings.get("qlib_data_path", str(Path.home() / ".qlib" / "qlib_data"))
-    default_models_path = st.session_state.settings.get("models_path", str(Path.home() / "qlib_models"))
-
-    st.sidebar.text_input("Qlib 数据存储根路径", value=default_qlib_data_path, key="qlib_data_path", on_change=update_setting, args=("qlib_data_path",))
-    st.sidebar.text_input("模型保存/加载根路径", value=default_models_path, key="models_path", on_change=update_setting, args=("models_path",))
-
-    if st.sidebar.button("保存当前路径设置"):
-        save_settings(st.session_state.settings)
-        st.sidebar.success("路径已保存!")
+    with st.sidebar:
+        _sidebar_paths()
 
     st.sidebar.markdown("---") # Separator
 
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 import yaml
 import streamlit as st
@@ -10,9 +11,44 @@ import io
 import json
 import gc
 from collections import deque
-from contextlib import redirect_stdout, redirect_stderr
+from functools import lru_cache
+import time
+import threading
+from contextlib import contextmanager
 
 
+class ThrottledPlaceholder:
+    """
+    Wraps a Streamlit placeholder so that rapid `code()` updates are coalesced.
+    The placeholder is re-rendered at most once every `min_interval` seconds and
+    only the last `max_chars` characters are sent; call `flush()` to force out
+    the latest content.
+    """
+
+    def __init__(self, placeholder, min_interval=0.25, max_chars=200_000):
+        self.placeholder = placeholder
+        self.min_interval = min_interval
+        self.max_chars = max_chars
+        self._pending = None
+        self._language = None
+        self._last_render = 0.0
+
+    def due(self) -> bool:
+        """True if a `code()` call now would render immediately. Lets callers skip building the body."""
+        return time.monotonic() - self._last_render >= self.min_interval
+
+    def code(self, body, language=None):
+        self._pending = body[-self.max_chars:]
+        self._language = language
+        if self.due():
+            self.flush()
+
+    def flush(self):
+        if self._pending is not None:
+            self.placeholder.code(self._pending, language=self._language)
+            self._pending = None
+            self._last_render = time.monotonic()
+
 class StreamlitLogHandler(io.StringIO):
     """
     A handler to redirect stdout/stderr to a Streamlit placeholder,
@@ -21,9 +57,10 @@ class StreamlitLogHandler(io.StringIO):
 
     def __init__(self, placeholder, max_lines=200):
         super().__init__()
-        self.placeholder = placeholder
+        self.placeholder = ThrottledPlaceholder(placeholder)
         self.buffer = deque(maxlen=max_lines)
         self.partial_line = ""
+        self._dirty = False
 
     def write(self, message):
         # Add new data to the partial line
@@ -36,14 +73,110 @@ class StreamlitLogHandler(io.StringIO):
         for line in lines:
             self.buffer.append(line)
 
-        # Update the display
+        # Only join the buffer when the throttle will actually render it
+        self._dirty = True
+        if self.placeholder.due():
+            self._render()
+
+    def _render(self):
         log_content = "\n".join(self.buffer)
         if self.partial_line:
             log_content += "\n" + self.partial_line
         self.placeholder.code(log_content, language="log")
+        self._dirty = False
+
+    def flush(self):
+        # print() and logging flush after nearly every write, so respect the throttle here
+        if self._dirty and self.placeholder.due():
+            self._render()
+
+    def finish(self):
+        """Renders whatever the throttle held back. Called once when the capture ends."""
+        if self._dirty:
+            self._render()
+        self.placeholder.flush()
+
+    def get_lines(self) -> list:
+        """Returns the buffered log lines, including an unterminated last line."""
+        lines = list(self.buffer)
+        if self.partial_line:
+            lines.append(self.partial_line)
+        return lines
+
+def get_log_lines(log_stream) -> list:
+    """Returns the captured log of a `StreamlitLogHandler` or `io.StringIO` as a list of lines."""
+    if isinstance(log_stream, StreamlitLogHandler):
+        return log_stream.get_lines()
+    return log_stream.getvalue().splitlines()
+
+class _ThreadLocalStream:
+    """
+    Stands in for `sys.stdout`/`sys.stderr` once installed. Writes go to the stream the
+    current thread registered through `capture_output`, or to the original stream
+    otherwise, so jobs running on different threads neither capture each other's output
+    nor restore the process-wide stream over one another.
+    """
+
+    def __init__(self, default):
+        self.default = default
+        self.local = threading.local()
+
+    def _target(self):
+        return getattr(self.local, "stream", None) or self.default
+
+    def write(self, s):
+        return self._target().write(s)
 
     def flush(self):
-        pass  # Not needed for real-time updates
+        return self._target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+_stream_install_lock = threading.Lock()
+
+def _thread_local_stream(name: str) -> _ThreadLocalStream:
+    """Returns the `_ThreadLocalStream` installed as `sys.<name>`, installing it on first use."""
+    with _stream_install_lock:
+        stream = getattr(sys, name)
+        if not isinstance(stream, _ThreadLocalStream):
+            stream = _ThreadLocalStream(stream)
+            setattr(sys, name, stream)
+        return stream
+
+@contextmanager
+def capture_output(log_stream):
+    """
+    Redirects this thread's stdout/stderr to `log_stream`, rendering its final state on exit
+    even if an error is raised. Other threads keep writing to their own streams.
+    """
+    stdout, stderr = _thread_local_stream("stdout"), _thread_local_stream("stderr")
+    previous = (getattr(stdout.local, "stream", None), getattr(stderr.local, "stream", None))
+    stdout.local.stream = stderr.local.stream = log_stream
+    try:
+        yield log_stream
+    finally:
+        stdout.local.stream, stderr.local.stream = previous
+        getattr(log_stream, "finish", log_stream.flush)()
+
+_qlib_lock = threading.Lock()
+_qlib_dir = None
+
+def init_qlib(qlib_dir: str):
+    """
+    Initializes Qlib for `qlib_dir` unless it is already initialized for that path.
+    Unlike `qlib.auto_init`, this skips the project-config search on every call and
+    re-initializes when the data path changes instead of silently keeping the old one.
+    """
+    global _qlib_dir
+    import qlib
+    from qlib.config import C
+    from qlib.constant import REG_CN
+    with _qlib_lock:
+        if C.registered and _qlib_dir == str(qlib_dir):
+            return
+        qlib.init(provider_uri=str(qlib_dir), region=REG_CN)
+        _qlib_dir = str(qlib_dir)
 
 # --- Decoupled Model and Factor Configurations ---
 
@@ -98,8 +231,9 @@ def get_script_path(script_name):
 def run_command_with_log(command, placeholder, throttle_lines: int = 1, max_lines: int = 200):
     """
     Runs a command and streams its output to a Streamlit placeholder in real-time,
-    showing only the last N lines.
+    showing only the last N lines. Returns those lines.
     """
+    placeholder = ThrottledPlaceholder(placeholder)
     buffer = deque(maxlen=max_lines)
     buffer.append(f"Running command: {command}\n\n")
     placeholder.code("".join(buffer), language="log")
@@ -112,29 +246,31 @@ def run_command_with_log(command, placeholder, throttle_lines: int = 1, max_line
     for line in iter(process.stdout.readline, ""):
         buffer.append(line)
         line_count += 1
-        # Update the UI every `throttle_lines` to prevent freezing
-        if line_count % throttle_lines == 0:
+        # Update the UI every `throttle_lines`, and only join the buffer when it will be rendered
+        if line_count % throttle_lines == 0 and placeholder.due():
             placeholder.code("".join(buffer), language="log")
 
     # Ensure the final, complete log is always displayed regardless of throttling
     final_log = "".join(buffer)
     placeholder.code(final_log, language="log")
+    placeholder.flush()
 
     process.stdout.close()
 
     if process.wait() != 0:
         raise subprocess.CalledProcessError(process.returncode, command, output=final_log)
+    return [line.rstrip("\n") for line in buffer]
 
 def update_daily_data(qlib_dir, start_date, end_date, placeholder):
     script_path = get_script_path("collector.py")
     command = f'"{sys.executable}" "{script_path}" update_data_to_bin --qlib_data_1d_dir "{qlib_dir}" --trading_date {start_date} --end_date {end_date}'
-    run_command_with_log(command, placeholder)
+    return run_command_with_log(command, placeholder)
 
-def check_data_health(qlib_dir, placeholder, n_jobs=1):
+def check_data_health(qlib_dir, placeholder, n_jobs=1, prefer="processes"):
     script_path = get_script_path("check_data_health.py")
-    command = f'"{sys.executable}" "{script_path}" check_data --qlib_dir "{qlib_dir}" --n_jobs {n_jobs}'
+    command = f'"{sys.executable}" "{script_path}" check_data --qlib_dir "{qlib_dir}" --n_jobs {n_jobs} --prefer {prefer}'
     # Use throttled logging for this high-volume output task
-    run_command_with_log(command, placeholder, throttle_lines=20)
+    return run_command_with_log(command, placeholder, throttle_lines=20)
 
 def get_data_summary(qlib_dir_str: str):
     """Scans the Qlib data directory and returns a summary of its contents."""
@@ -150,17 +286,15 @@ def get_data_summary(qlib_dir_str: str):
             summary["error"] = "指定的Qlib数据路径不存在。"
             return summary
 
-        # Initialize Qlib to use its data API
-        import qlib
-        qlib.init(provider_uri=qlib_dir_str, expression_cache=None)
-        from qlib.data import D
-
-        # Get date range from calendar
-        calendar = D.calendar()
-        if calendar is not None and len(calendar) > 0:
-            start_date = pd.to_datetime(calendar[0]).strftime('%Y-%m-%d')
-            end_date = pd.to_datetime(calendar[-1]).strftime('%Y-%m-%d')
-            summary["date_range"] = f"{start_date} to {end_date}"
+        # Get date range from the calendar file. This is read directly rather than via
+        # `D.calendar()` so that scanning a directory doesn't re-initialize Qlib.
+        calendar_file = qlib_dir / "calendars" / "day.txt"
+        if calendar_file.exists():
+            calendar = [line.strip() for line in calendar_file.read_text().splitlines() if line.strip()]
+            if calendar:
+                start_date = pd.to_datetime(calendar[0]).strftime('%Y-%m-%d')
+                end_date = pd.to_datetime(calendar[-1]).strftime('%Y-%m-%d')
+                summary["date_range"] = f"{start_date} to {end_date}"
 
         # Get instrument list
         instruments_dir = qlib_dir / "instruments"
@@ -190,9 +324,8 @@ def train_model(
     segments: dict, model_params: dict = None,
     custom_model_name: str = None, finetune_model_path: str = None, log_placeholder=None
 ):
-    import qlib
     from qlib.utils import init_instance_by_config
-    qlib.auto_init(provider_uri=qlib_dir)
+    init_qlib(qlib_dir)
 
     # --- Dynamically Build Config ---
     model_config = copy.deepcopy(MODELS[model_name])
@@ -216,20 +349,19 @@ def train_model(
     dataset = init_instance_by_config(task_config["dataset"])
 
     if finetune_model_path:
-        with open(finetune_model_path, 'rb') as f:
-            initial_model = pickle.load(f)
+        initial_model = load_model(finetune_model_path)
         model_config['kwargs']['init_model'] = initial_model
 
     model = init_instance_by_config(task_config["model"])
 
     # Redirect stdout/stderr to the Streamlit placeholder if provided
     log_stream = StreamlitLogHandler(log_placeholder) if log_placeholder else io.StringIO()
-    with redirect_stdout(log_stream), redirect_stderr(log_stream):
+    with capture_output(log_stream):
         print("--- 模型训练开始 ---")
         model.fit(dataset)
         print("--- 模型训练结束 ---")
 
-    training_log = log_stream.buffer if isinstance(log_stream, StreamlitLogHandler) else log_stream.getvalue()
+    training_log = get_log_lines(log_stream)
 
     if custom_model_name:
         model_basename = custom_model_name
@@ -253,9 +385,9 @@ def train_model(
         if 'initial_model' in locals():
             del initial_model
         gc.collect()
-        training_log += "\n[INFO] Memory cleanup complete."
+        training_log.append("[INFO] Memory cleanup complete.")
     except Exception as e:
-        training_log += f"\n[WARNING] Error during memory cleanup: {e}"
+        training_log.append(f"[WARNING] Error during memory cleanup: {e}")
 
     return str(model_save_path), training_log
 
@@ -263,10 +395,22 @@ def train_model(
 CONFIG_FILE = "config.json"
 
 def save_settings(settings: dict):
-    """Saves settings to a JSON file."""
+    """
+    Saves settings to a JSON file. The file is written to a temporary file and renamed
+    into place, so a crash mid-write never leaves a truncated config behind. Nothing is
+    written if the file already holds the same settings.
+    """
     try:
-        with open(CONFIG_FILE, 'w') as f:
-            json.dump(settings, f, indent=4)
+        content = json.dumps(settings, indent=4)
+        config_path = Path(CONFIG_FILE)
+        if config_path.exists() and config_path.read_text() == content:
+            return
+        tmp_path = config_path.with_name(config_path.name + ".tmp")
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, config_path)
     except Exception as e:
         st.error(f"Error saving settings: {e}")
 
@@ -281,43 +425,83 @@ def load_settings() -> dict:
             return {}
     return {}
 
-def predict(model_path_str: str, qlib_dir: str, prediction_date: str):
-    import qlib
-    from qlib.utils import init_instance_by_config
-    qlib.auto_init(provider_uri=qlib_dir)
+def load_model(model_path_str: str):
+    """Loads a pickled model from disk."""
+    with open(model_path_str, 'rb') as f:
+        return pickle.load(f)
+
+# libyaml-backed loader with the same FullLoader semantics, if PyYAML was built with it
+_YAML_LOADER = getattr(yaml, "CFullLoader", yaml.FullLoader)
+
+@lru_cache(maxsize=64)
+def _parse_model_config(config_path: str, mtime_ns: int) -> dict:
+    with open(config_path, "r") as f:
+        return yaml.load(f, Loader=_YAML_LOADER)
 
+def load_model_config(model_path_str: str) -> dict:
+    """
+    Returns the YAML config saved next to a model as a fresh copy that callers may modify.
+    Parsing is cached per file and mtime, so e.g. day-by-day predictions read it once.
+    """
     model_path = Path(model_path_str)
     config_path = model_path.with_suffix(".yaml")
-    if not config_path.exists():
-        raise FileNotFoundError(f"Config file {config_path} not found for model {model_path.name}")
-    with open(config_path, 'r') as f:
-        config = yaml.load(f, Loader=yaml.FullLoader)
-    with open(model_path, 'rb') as f:
-        model = pickle.load(f)
-    config["dataset"]["kwargs"]["handler"]["kwargs"]["start_time"] = pd.to_datetime(prediction_date) - pd.DateOffset(years=2)
-    config["dataset"]["kwargs"]["handler"]["kwargs"]["end_time"] = prediction_date
-    config["dataset"]["kwargs"]["segments"]["test"] = (prediction_date, prediction_date)
-    dataset = init_instance_by_config(config["dataset"])
-    prediction = model.predict(dataset, segment="test")
-    prediction.name = 'score'
-    prediction = prediction.reset_index().rename(columns={'instrument': 'StockID', 'datetime': 'Date'})
-    return prediction.sort_values(by="score", ascending=False)
+    try:
+        mtime_ns = config_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Config file {config_path} not found for model {model_path.name}") from None
+    return copy.deepcopy(_parse_model_config(str(config_path), mtime_ns))
 
-def backtest_strategy(model_path_str: str, qlib_dir: str, start_time: str, end_time: str, strategy_kwargs: dict, exchange_kwargs: dict):
-    import qlib
+def predict(model_path_str: str, qlib_dir: str, prediction_date: str, model=None):
+    """
+    Predicts scores for all stocks on `prediction_date`.
+    An already-loaded `model` may be passed to skip unpickling it from `model_path_str`.
+    """
+    models = {model_path_str: model} if model is not None else None
+    return predict_batch([model_path_str], qlib_dir, prediction_date, models=models)[model_path_str]
+
+def predict_batch(model_paths: list, qlib_dir: str, prediction_date: str, models: dict = None) -> dict:
+    """
+    Predicts scores for all stocks on `prediction_date` with each model in `model_paths`.
+    Models whose dataset config matches (same factor and stock pool) share a single
+    feature build. Distinct configs are built one after another, since qlib's data
+    providers and expression cache are process-global and not documented as thread-safe.
+    Returns {model_path: DataFrame} in the format of `predict`; `models` may map paths to
+    already-loaded models.
+    """
+    from qlib.utils import init_instance_by_config
+    init_qlib(qlib_dir)
+
+    groups = {}
+    for model_path_str in model_paths:
+        config = load_model_config(model_path_str)
+        config["dataset"]["kwargs"]["handler"]["kwargs"]["start_time"] = pd.to_datetime(prediction_date) - pd.DateOffset(years=2)
+        config["dataset"]["kwargs"]["handler"]["kwargs"]["end_time"] = prediction_date
+        config["dataset"]["kwargs"]["segments"]["test"] = (prediction_date, prediction_date)
+        dataset_key = json.dumps(config["dataset"], sort_keys=True, default=str)
+        groups.setdefault(dataset_key, (config["dataset"], []))[1].append(model_path_str)
+
+    results = {}
+    for dataset_config, group_paths in groups.values():
+        dataset = init_instance_by_config(dataset_config)
+        for model_path_str in group_paths:
+            model = models.get(model_path_str) if models else None
+            if model is None:
+                model = load_model(model_path_str)
+            prediction = model.predict(dataset, segment="test")
+            prediction.name = 'score'
+            prediction = prediction.reset_index().rename(columns={'instrument': 'StockID', 'datetime': 'Date'})
+            results[model_path_str] = prediction.sort_values(by="score", ascending=False)
+    return {model_path_str: results[model_path_str] for model_path_str in model_paths}
+
+def backtest_strategy(model_path_str: str, qlib_dir: str, start_time: str, end_time: str, strategy_kwargs: dict, exchange_kwargs: dict, model=None):
     from qlib.utils import init_instance_by_config
     from qlib.contrib.strategy import TopkDropoutStrategy
     from qlib.contrib.evaluate import backtest_daily, risk_analysis
-    qlib.auto_init(provider_uri=qlib_dir)
+    init_qlib(qlib_dir)
 
-    model_path = Path(model_path_str)
-    config_path = model_path.with_suffix(".yaml")
-    if not config_path.exists():
-        raise FileNotFoundError(f"Config file {config_path} not found for model {model_path.name}")
-    with open(config_path, 'r') as f:
-        config = yaml.load(f, Loader=yaml.FullLoader)
-    with open(model_path, 'rb') as f:
-        model = pickle.load(f)
+    config = load_model_config(model_path_str)
+    if model is None:
+        model = load_model(model_path_str)
     config["dataset"]["kwargs"]["handler"]["kwargs"]["start_time"] = start_time
     config["dataset"]["kwargs"]["handler"]["kwargs"]["end_time"] = end_time
     config["dataset"]["kwargs"]["segments"]["test"] = (start_time, end_time)
@@ -338,26 +522,37 @@ def backtest_strategy(model_path_str: str, qlib_dir: str, start_time: str, end_t
     # Return both the daily report for plotting and the analysis report for metrics
     return report_df, analysis_df
 
-def get_historical_prediction(model_path_str: str, qlib_dir: str, stock_id: str, start_date: str, end_date: str, placeholder=None):
-    # This can be slow as it predicts day by day
-    all_scores = []
-    date_range = pd.date_range(start=start_date, end=end_date, freq='B') # Business days
+def get_historical_prediction(model_path_str: str, qlib_dir: str, stock_id: str, start_date: str, end_date: str, placeholder=None, model=None):
+    """
+    Scores `stock_id` on every trading day in [start_date, end_date].
+    The whole window is scored with one dataset build and one `model.predict` call. The
+    handler keeps the model's own stock pool, so the scores match a single-day `predict`.
+    """
+    from qlib.utils import init_instance_by_config
+    init_qlib(qlib_dir)
+
+    config = load_model_config(model_path_str)
+    if model is None:
+        model = load_model(model_path_str)
+    if placeholder:
+        placeholder.text(f"正在构建 {start_date} 至 {end_date} 的特征...")
+    config["dataset"]["kwargs"]["handler"]["kwargs"]["start_time"] = pd.to_datetime(start_date) - pd.DateOffset(years=2)
+    config["dataset"]["kwargs"]["handler"]["kwargs"]["end_time"] = end_date
+    config["dataset"]["kwargs"]["segments"]["test"] = (start_date, end_date)
+    dataset = init_instance_by_config(config["dataset"])
 
-    for i, date in enumerate(date_range):
-        date_str = date.strftime("%Y-%m-%d")
-        if placeholder:
-            placeholder.text(f"正在预测第 {i+1}/{len(date_range)} 天: {date_str}")
-        try:
-            pred_df = predict(model_path_str, qlib_dir, date_str)
-            stock_score = pred_df[pred_df['StockID'] == stock_id]
-            if not stock_score.empty:
-                all_scores.append({'Date': date, 'Score': stock_score.iloc[0]['score']})
-        except Exception as e:
-            # Skip days where prediction fails (e.g., no data, market closed)
-            print(f"Could not predict for {date_str}: {e}")
-            continue
+    if placeholder:
+        placeholder.text("正在预测...")
+    prediction = model.predict(dataset, segment="test")
+    if placeholder:
+        placeholder.empty()
 
-    return pd.DataFrame(all_scores)
+    instruments = prediction.index.get_level_values("instrument")
+    stock_scores = prediction[instruments == stock_id]
+    return pd.DataFrame({
+        "Date": stock_scores.index.get_level_values("datetime"),
+        "Score": stock_scores.to_numpy(),
+    })
 
 def get_model_info(model_path_str: str):
     """
@@ -365,13 +560,7 @@ def get_model_info(model_path_str: str):
     """
     info = {"stock_pool": "N/A", "error": None}
     try:
-        model_path = Path(model_path_str)
-        config_path = model_path.with_suffix(".yaml")
-        if not config_path.exists():
-            raise FileNotFoundError(f"Config file not found at {config_path}")
-
-        with open(config_path, "r") as f:
-            config = yaml.load(f, Loader=yaml.FullLoader)
+        config = load_model_config(model_path_str)
 
         # Safely navigate the dictionary
         stock_pool = config.get("dataset", {}).get("kwargs", {}).get("handler", {}).get("kwargs", {}).get("instruments")
@@ -386,30 +575,25 @@ def get_model_info(model_path_str: str):
     return info
 
 
-def evaluate_model(model_path_str: str, qlib_dir: str, log_placeholder=None):
+def evaluate_model(model_path_str: str, qlib_dir: str, log_placeholder=None, model=None):
     """
     Evaluate a trained model using qlib's standard analysis recorders.
     Returns a dictionary containing signal analysis and portfolio analysis results.
+    An already-loaded `model` may be passed to skip unpickling it from `model_path_str`.
     """
-    import qlib
     from qlib.utils import init_instance_by_config
     from qlib.workflow import R
     from qlib.workflow.record_temp import SignalRecord, PortAnaRecord, SigAnaRecord
 
     log_stream = StreamlitLogHandler(log_placeholder) if log_placeholder else io.StringIO()
-    with redirect_stdout(log_stream), redirect_stderr(log_stream):
+    with capture_output(log_stream):
         print("--- 模型评估开始 ---")
-        qlib.auto_init(provider_uri=qlib_dir)
+        init_qlib(qlib_dir)
 
-        model_path = Path(model_path_str)
-        config_path = model_path.with_suffix(".yaml")
-        if not config_path.exists():
-            raise FileNotFoundError(f"Config file {config_path} not found for model {model_path.name}")
-        with open(config_path, "r") as f:
-            config = yaml.load(f, Loader=yaml.FullLoader)
+        config = load_model_config(model_path_str)
 
-        with open(model_path, "rb") as f:
-            model = pickle.load(f)
+        if model is None:
+            model = load_model(model_path_str)
 
         print("为保证评估顺利进行，临时创建`drop_raw=False`的数据集...")
         eval_dataset_config = copy.deepcopy(config["dataset"])
@@ -478,5 +662,5 @@ def evaluate_model(model_path_str: str, qlib_dir: str, log_placeholder=None):
             portfolio_report = recorder.load_object("port_ana/report_normal.pkl")
             print("--- 投资组合分析完成 ---")
 
-    eval_log = log_stream.buffer if isinstance(log_stream, StreamlitLogHandler) else log_stream.getvalue()
+    eval_log = get_log_lines(log_stream)
     return {"signal": signal_report, "portfolio": portfolio_report}, eval_log
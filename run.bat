@@ -20,6 +20,10 @@ echo [Step 2/2] All packages installed. Starting the Qlib Visual Tool...
 echo You can close this window after the application has opened in your browser.
 echo.
 
+REM Keep BLAS single-threaded; model training sets its own thread count (n_jobs)
+if not defined OPENBLAS_NUM_THREADS set OPENBLAS_NUM_THREADS=1
+if not defined MKL_NUM_THREADS set MKL_NUM_THREADS=1
+
 streamlit run app.py
 
 pause
@@ -18,16 +18,19 @@ def check_instrument_data(
     large_step_threshold_price: float,
     large_step_threshold_volume: float,
     missing_data_num: int,
+    init_qlib: bool = True,
 ) -> Dict[str, Any]:
     """
     Checks a single instrument for data completeness and correctness.
-    This function is designed to be called in parallel.
+    This function is designed to be called in parallel. `init_qlib` must be True when
+    it runs in a separate worker process; threads share the caller's Qlib config.
     """
     problems = {"instrument": instrument, "missing_data": {}, "large_steps": [], "missing_columns": [], "missing_factor": None}
 
     try:
         # Initialize qlib in each worker process
-        qlib.init(provider_uri=qlib_dir)
+        if init_qlib:
+            qlib.init(provider_uri=qlib_dir)
         df = D.features([instrument], required_fields, freq=freq)
         if df.empty:
             problems["missing_data"] = {col: "all" for col in required_fields}
@@ -105,15 +108,18 @@ class DataHealthChecker:
 
         qlib.init(provider_uri=self.qlib_dir)
 
-    def check_data(self, n_jobs: int = 1, limit_nums: Optional[int] = None):
+    def check_data(self, n_jobs: int = 1, limit_nums: Optional[int] = None, prefer: str = "processes"):
         """
         Main method to run the data health check.
 
         Args:
             n_jobs (int): Number of parallel jobs to run. -1 means use all available cores.
             limit_nums (Optional[int]): Limit the number of instruments to check for debugging.
+            prefer (str): joblib backend preference, "processes" or "threads". Processes are the
+                default because Qlib's data providers and caches are process-global and not
+                thread-safe; "threads" skips the per-worker Qlib init but shares those caches.
         """
-        logger.info(f"Starting data health check with {n_jobs} parallel jobs...")
+        logger.info(f"Starting data health check with {n_jobs} parallel jobs ({prefer})...")
 
         instruments = D.instruments(market="all")
         instrument_list = D.list_instruments(instruments=instruments, as_list=True, freq=self.freq)
@@ -124,7 +130,7 @@ class DataHealthChecker:
 
         required_fields = ["$open", "$close", "$low", "$high", "$volume", "$factor"]
 
-        results = Parallel(n_jobs=n_jobs)(
+        results = Parallel(n_jobs=n_jobs, prefer=prefer, batch_size="auto")(
             delayed(check_instrument_data)(
                 instrument=inst,
                 qlib_dir=self.qlib_dir,
@@ -133,6 +139,7 @@ class DataHealthChecker:
                 large_step_threshold_price=self.large_step_threshold_price,
                 large_step_threshold_volume=self.large_step_threshold_volume,
                 missing_data_num=self.missing_data_num,
+                init_qlib=prefer != "threads",
             )
             for inst in instrument_list
         )